@@ -0,0 +1,74 @@
+# cython: embedsignature=True
+"""
+C bridge between the Fortran ddaspk solver and a python residual function.
+
+The f2py callback for the residual converts every argument to a python
+object and copies the returned residual. `res_trampoline` has the Fortran
+calling convention of the ddaspk residual instead, and is handed to the f2py
+wrapper as a PyCapsule, so ddaspk calls it directly. It passes y, yprime and
+the residual to the python function as numpy arrays on the Fortran memory,
+so the residual is written in place. These arrays are only valid during the
+call, and y and yprime are read only.
+
+There is one active residual per process, set with `set_residual` before
+calling ddaspk.
+"""
+
+import numpy as np
+cimport numpy as np
+from cpython.pycapsule cimport PyCapsule_New
+
+np.import_array()
+
+cdef object _resfn = None
+cdef object _error = None
+
+cdef void res_trampoline(int *neq, double *t, double *y, double *yp,
+                         double *cj, double *delta, int *ires,
+                         double *rpar, int *ipar) noexcept with gil:
+    """ function with the signature of the ddaspk RES routine """
+    global _error
+    cdef np.npy_intp n = neq[0]
+    cdef np.ndarray y_arr, yp_arr, delta_arr
+
+    try:
+        y_arr = np.PyArray_SimpleNewFromData(1, &n, np.NPY_DOUBLE, <void *> y)
+        yp_arr = np.PyArray_SimpleNewFromData(1, &n, np.NPY_DOUBLE,
+                                              <void *> yp)
+        delta_arr = np.PyArray_SimpleNewFromData(1, &n, np.NPY_DOUBLE,
+                                                 <void *> delta)
+        np.PyArray_CLEARFLAGS(y_arr, np.NPY_ARRAY_WRITEABLE)
+        np.PyArray_CLEARFLAGS(yp_arr, np.NPY_ARRAY_WRITEABLE)
+        _resfn(t[0], y_arr, yp_arr, delta_arr)
+    except BaseException as e:
+        # ires = -2 makes ddaspk return, the error is raised from there.
+        # Nothing may propagate out of here, ddaspk could not handle it
+        _error = e
+        ires[0] = -2
+
+def residual_capsule():
+    """
+    Return a PyCapsule with the address of the residual trampoline, to pass to
+    the f2py ddaspk wrapper as residual callback.
+    """
+    return PyCapsule_New(<void *> res_trampoline, NULL, NULL)
+
+def set_residual(resfn):
+    """
+    Set the python residual called by the trampoline, and return the
+    previous one.
+    """
+    global _resfn, _error
+    previous = _resfn
+    _resfn = resfn
+    _error = None
+    return previous
+
+def pop_error():
+    """
+    Return the exception raised by the last residual call if any, and clear it.
+    """
+    global _error
+    error = _error
+    _error = None
+    return error
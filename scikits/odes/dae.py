@@ -22,15 +22,15 @@ of size :math:`i × i`; and :math:`f(t,y)` is a vector of size :math:`i` or more
 
 """
 
-from __future__ import print_function
+from __future__ import division, print_function
 
-__all__ = ['dae']
-__version__ = "$Id$"
+__all__ = ['dae', 'batchdae']
 __docformat__ = "restructuredtext en"
 
-from numpy import asarray, array, zeros, sin, int32, isscalar, empty, alen
+from numpy import asarray, array, zeros, sin, int32, isscalar, empty
+from collections import OrderedDict
 from copy import copy
-import re, sys
+import sys
 
 class DaeBase(object):
     """
@@ -45,6 +45,27 @@ class DaeBase(object):
     """
 
     integrator_classes = []
+    _registry = OrderedDict()
+
+    def __init_subclass__(cls, **kwargs):
+        """
+        Register subclasses with a working solver, on Python >= 3.6.
+        Older versions must call `register` explicitly.
+        """
+        super(DaeBase, cls).__init_subclass__(**kwargs)
+        if getattr(cls, '_runner', None) is not None:
+            DaeBase.register(cls)
+
+    @staticmethod
+    def register(integrator):
+        """
+        Make a DAE solver class available to `dae`, under its class name and
+        under its name attribute (case insensitive).
+        """
+        DaeBase.integrator_classes.append(integrator)
+        for name in (integrator.__name__, getattr(integrator, 'name', None)):
+            if isinstance(name, str):
+                DaeBase._registry.setdefault(name.lower(), integrator)
 
     def __init__(self, Rfn, **options):
         raise NotImplementedError('all DAE solvers must implement this')
@@ -212,8 +233,12 @@ class dae(object):
 
     Parameters
     ----------
-    integrator_name : ``'ida'``, ``'ddaspk'`` or ``'lsodi'``
-        The integrator solver to use.
+    integrator_name : ``'ida'``, ``'ddaspk'``, ``'ddaspk_c'`` or ``'lsodi'``
+        The integrator solver to use. ``'ddaspk_c'`` is ddaspk calling the
+        residual through a compiled bridge instead of through f2py. The
+        arrays passed to the residual are then only valid during the call,
+        and y and yprime are read only. It is only present if the
+        _dae_cbridge extension was built.
 
     eqsres : residual function
         Residual of the DAE. The signature of this function depends on the
@@ -445,6 +470,107 @@ class dae(object):
         if hasattr(self, '_integrator'):
             del self._integrator
 
+class batchdae(object):
+    """
+    Interface to solve an ensemble of independent copies of the same
+    differential algebraic equations, eg for a sweep over initial conditions.
+
+    The B copies of a system of n equations are solved as one joint system of
+    size B*n, so the residual is evaluated once for the whole ensemble instead
+    of once per copy, and can be written with vectorized numpy operations.
+
+    Parameters
+    ----------
+    integrator_name : ``'ida'``, ``'ddaspk'``, ``'ddaspk_c'`` or ``'lsodi'``
+        The integrator solver to use, see `dae`.
+
+    eqsres : residual function
+        Vectorized residual of the DAE, with signature
+
+            ``eqsres(x, y, yprime, return_residual)``
+
+        as for `dae`, but with y, yprime and return_residual arrays of shape
+        (B, n), row b belonging to copy b of the ensemble.
+
+    options : mapping
+        Additional options for initialization, passed to the solver, see
+        `dae`. The jacobian of the joint system is block diagonal with n x n
+        blocks, so with a direct linear solver it pays to set lband and uband
+        to n-1 (for ida, together with linsolver='band').
+
+    Examples
+    --------
+    The simple oscillator of `dae` for three initial conditions:
+
+    >>> import numpy as np
+    >>> k = 4.0
+    >>> m = 1.0
+    >>> def reseqn(t, x, xdot, result):
+        ... result[:, 0] = m*xdot[:, 1] + k*x[:, 0]
+        ... result[:, 1] = xdot[:, 0] - x[:, 1]
+    >>> initx = np.array([[1, 0.1], [2, 0.1], [3, 0.]])
+    >>> initxp = np.column_stack((initx[:, 1], -k/m*initx[:, 0]))
+    >>> from scikits.odes import batchdae
+    >>> solver = batchdae('ddaspk', reseqn, lband=1, uband=1)
+    >>> result = solver.solve([0., 1., 2.], initx, initxp)
+    """
+
+    def __init__(self, integrator_name, eqsres, **options):
+        self._eqsres = eqsres
+        self._shape = None
+        self._dae = dae(integrator_name, self._res, **options)
+
+    def _res(self, t, y, yp, result):
+        shape = self._shape
+        return self._eqsres(t, y.reshape(shape), yp.reshape(shape),
+                            result.reshape(shape))
+
+    def _unflatten(self, y):
+        if y is None:
+            return None
+        y = asarray(y)
+        return y.reshape(y.shape[:-1] + self._shape)
+
+    def set_options(self, **options):
+        """
+        Set specific options for the solver, see `dae.set_options`.
+        """
+        return self._dae.set_options(**options)
+
+    def solve(self, tspan, y0, yp0):
+        """
+        Runs the solver for all copies of the ensemble, see `dae.solve`.
+
+        Parameters
+        ----------
+        tspan : list/array
+            A list of times at which the computed value will be returned. Must contain the start time as first entry.
+        y0 : array
+            initial values, of shape (B, n)
+        yp0 : array
+            initial values of derivatives, of shape (B, n)
+
+        Returns
+        -------
+        As `dae.solve`, with the solution and derivative arrays reshaped so
+        the last two axes are (B, n).
+        """
+        y0 = asarray(y0)
+        yp0 = asarray(yp0)
+        if y0.ndim != 2 or y0.shape != yp0.shape:
+            raise ValueError('y0 and yp0 must both be arrays of shape (B, n)')
+        self._shape = y0.shape
+        result = self._dae.solve(tspan, y0.ravel(), yp0.ravel())
+        if hasattr(result, '_replace'):
+            return result._replace(**dict(
+                (field, getattr(result, field)._replace(
+                    y=self._unflatten(getattr(result, field).y),
+                    ydot=self._unflatten(getattr(result, field).ydot)))
+                for field in ('values', 'errors', 'roots', 'tstop')))
+        flag, t, y, yp, t_err, y_err, yp_err = result
+        return (flag, t, self._unflatten(y), self._unflatten(yp),
+                t_err, self._unflatten(y_err), self._unflatten(yp_err))
+
 #------------------------------------------------------------------------------
 # DAE integrators
 #------------------------------------------------------------------------------
@@ -454,7 +580,7 @@ def find_dae_integrator(name):
         ## ida
         try:
             from .sundials import ida
-            DaeBase.integrator_classes.append(ida.IDA)
+            DaeBase.register(ida.IDA)
         except ValueError as msg:
             print('Could not load IDA solver', msg)
         except ImportError:
@@ -474,9 +600,12 @@ def find_dae_integrator(name):
 
         dae.LOADED = True
 
-    for cl in DaeBase.integrator_classes:
-        if re.match(name, cl.__name__, re.I):
-            return cl
-        elif hasattr(cl, name) and re.match(name, cl.name, re.I):
+    key = name.lower()
+    cl = DaeBase._registry.get(key)
+    if cl is not None:
+        return cl
+    # allow abbreviated names
+    for clname, cl in DaeBase._registry.items():
+        if clname.startswith(key):
             return cl
     raise ValueError('Integrator name %s does not exsist' % name)
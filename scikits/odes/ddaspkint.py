@@ -45,6 +45,33 @@ with
     return value: Not needed. However, for use with other solvers, consider 
               returning 0 on success.
 
+For small systems most of the time is spent calling res and jac from
+Fortran through python. Both can instead be given as compiled functions with
+the Fortran calling convention of ddaspk, eg a Numba cfunc, which ddaspk then
+calls directly. All arguments are pointers:
+    res_cfunc(neq, x, y, yprime, cj, delta, ires, rpar, ipar)
+    jac_cfunc(neq, x, y, yprime, pd, cj, rpar, ipar)
+with neq, ires and ipar pointing to int, the others to double. delta must be
+filled with the residual, pd with the jacobian in Fortran (column major)
+order. Without lband/uband this is the dense jacobian,
+    pd[i + j*neq] = jac[i,j]
+With lband/uband set, a compiled jac always gets the banded storage of ddaspk,
+also if the band covers the full matrix:
+    pd[(i-j+lband+uband) + j*(2*lband+uband+1)] = jac[i,j]
+ires and ipar/rpar can be ignored. With Numba this reads:
+    from numba import cfunc, types
+    dptr = types.CPointer(types.double)
+    iptr = types.CPointer(types.intc)
+    @cfunc(types.void(iptr, dptr, dptr, dptr, dptr, dptr, iptr, dptr, iptr))
+    def res_cfunc(neq, x, y, yprime, cj, delta, ires, rpar, ipar):
+        delta[0] = ...
+and is passed to the solver with the rfn_cfunc option.
+
+For a python residual, the integrator ddaspk_c, so dae('ddaspk_c', res),
+calls res through a compiled bridge instead of through f2py, which avoids
+creating and copying arrays on every residual evaluation. The arrays passed to
+res are then only valid during the call, y and yprime are read only.
+
 This integrator accepts the following parameters in the initializer or 
 set_options method of the dae class:
 
@@ -52,6 +79,10 @@ set_options method of the dae class:
         set, as rfn will be set during initialization. If the residual function
         of initialization needs to be reset, this option can be used
 - jacfn : jacobian function, see above for signature. Default is None.
+- rfn_cfunc : compiled residual function, see above. If given, it is used
+  instead of rfn. Default is None.
+- jacfn_cfunc : compiled jacobian function, see above. If given, it is used
+  instead of jacfn. Default is None.
 - atol : float or sequence of length i
   absolute tolerance for solution
 - rtol : float or sequence of length i
@@ -60,7 +91,10 @@ set_options method of the dae class:
 - uband : None or int
   Jacobian band width, jac[i,j] != 0 for i-lband <= j <= i+uband.
   Setting these requires your jac routine to return the jacobian
-  in packed format, jac_packed[i-j+lband, j] = jac[i,j].
+  in packed format, jac_packed[i-j+uband, j] = jac[i,j].
+  If the band covers the full matrix, lband+uband+1 >= n, the dense linear
+  solver is used, which is faster. This does not apply to jacfn_cfunc, which
+  always gets banded storage, see above.
 - tstop : None or float. If given, tstop is a critical time point
   beyond which no integration occurs
 - max_steps : int
@@ -85,6 +119,16 @@ set_options method of the dae class:
   If yp0, then the differential variables will be used to solve for the 
     algebraic variables and the derivative of the differential variables. 
     Which are the algebraic variables must be indicated with algebraic_var method
+- warm_initcond: bool
+  If True and compute_initcond is set, a new init_step on the same problem
+  (same residual, size, jacobian and band) starts the initial condition
+  computation from the consistent values found by the previous init_step,
+  instead of from the given guess. The given y0 of the differential
+  variables is still used in the 'yp0' case. This reduces the Newton
+  iterations of repeated init_step calls with slightly perturbed y0, as in
+  parameter sweeps. Default=False.
+  Note: this is unsafe unless the perturbation of y0 is small, otherwise
+  the computation may fail or converge to another solution
 - exclude_algvar_from_error: bool
   To determine solution, do not take the algebraic variables error control into 
   account. Default=False
@@ -109,24 +153,37 @@ set_options method of the dae class:
                     'algebraic_vars_idx' array.
 """
 
-from __future__ import print_function
+from __future__ import division, print_function
 
-__all__ = ['ddaspk']
-__version__ = "$Id$"
+__all__ = ['ddaspk', 'ddaspk_c']
 __docformat__ = "restructuredtext en"
 
-from numpy import asarray, array, zeros, sin, int32, isscalar, empty, alen
-from copy import copy
+from numpy import (asarray, array, zeros, sin, int32, isscalar, empty,
+                   indices, ones)
 from .dae import DaeBase
+import ctypes
 import re, sys
+import warnings
+
+_PyCapsule_New = ctypes.pythonapi.PyCapsule_New
+_PyCapsule_New.restype = ctypes.py_object
+_PyCapsule_New.argtypes = (ctypes.c_void_p, ctypes.c_char_p, ctypes.c_void_p)
+
+def _cfunc_capsule(cfunc):
+    """Wrap the address of a compiled function (eg a Numba cfunc) in a
+    PyCapsule. f2py calls a capsule passed as callback directly, without
+    going through python.
+    """
+    return _PyCapsule_New(getattr(cfunc, 'address', cfunc), None, None)
 
 class ddaspk(DaeBase):
     try:
         from .ddaspk import ddaspk as _runner
     except ImportError:
-        print(sys.exc_info()[1])
+        warnings.warn(str(sys.exc_info()[1]))
         _runner = None
     # _runner = getattr(_ddaspk,'ddaspk',None)
+    _cbridge = None
     name = 'ddaspk'
 
     messages = { 1: 'A step was successfully taken in the '
@@ -190,18 +247,26 @@ class ddaspk(DaeBase):
             'enforce_nonnegativity': False, 
             'nonneg_type': None, 
             'compute_initcond': None,
+            'warm_initcond': False,
             'constraint_init': False, 
             'constraint_type': None, 
             'algebraic_vars_idx': None,
             'exclude_algvar_from_error': False, 
             'rfn': None,
             'jacfn': None,
+            'rfn_cfunc': None,
+            'jacfn_cfunc': None,
             }
         self.t = None
         self.y = None
         self.yp = None
         self.tmp_res = None
         self.tmp_jac = None
+        self.info = zeros((20,), int32)
+        self.rwork = None
+        self.iwork = None
+        self._last_state = None
+        self.algebraic_var = None
         self.options = default_values
         self.set_options(rfn=resfn, **options)
         self.initialized = False
@@ -211,6 +276,15 @@ class ddaspk(DaeBase):
         """
         for (key, value) in options.items():
             self.options[key.lower()] = value
+            if key.lower() == 'algebraic_vars_idx':
+                # rebuilt from the new indices on the next reset
+                self.algebraic_var = None
+        # convert here, as init_step calls _init_data on every reset
+        constraint_type = self.options['constraint_type']
+        if constraint_type is None or isscalar(constraint_type):
+            self._constraint_type = constraint_type
+        else:
+            self._constraint_type = asarray(constraint_type, int32)
         self.initialized = False
         
     def _init_data(self):
@@ -220,6 +294,8 @@ class ddaspk(DaeBase):
         self.ml = self.options['lband']
         self.jac = self.options['jacfn']
         self.res = self.options['rfn']
+        self.jac_cfunc = self.options['jacfn_cfunc']
+        self.res_cfunc = self.options['rfn_cfunc']
 
         self.tstop = self.options['tstop']
         if self.options['order'] > 5 or self.options['order'] < 1:
@@ -238,7 +314,7 @@ class ddaspk(DaeBase):
         if (self.nonneg == 1 or self.nonneg == 3) and self.options['constraint_type'] is None:
             raise ValueError('Give type of init cond contraint as '\
                               'an int array (>=0, >0, <=0, <0) or as int')
-        else: self.constraint_type = self.options['constraint_type']
+        self.constraint_type = self._constraint_type
         if self.options['compute_initcond'] is None: 
             self.compute_initcond = 0
         elif re.match(self.options['compute_initcond'], r'y0', re.I): 
@@ -253,6 +329,7 @@ class ddaspk(DaeBase):
                     'algebraic variables with the algebraic_vars_idx option')
         self.algvaridx = self.options['algebraic_vars_idx']
         self.excl_algvar_err = self.options['exclude_algvar_from_error']
+        self.warm_initcond = self.options['warm_initcond']
 
         self.success = 1
     
@@ -263,18 +340,34 @@ class ddaspk(DaeBase):
         self.y0 = y0
         self.yp0 = yp0
         self.t = t0
-        self._reset(len(y0), self.options['jacfn'] is not None)
+        self._reset(len(y0), self.jac is not None or
+                             self.jac_cfunc is not None)
         
         if self.compute_initcond:
             if self.first_step <= 0.:
                 first_step = 1e-18
             else:
                 first_step = self.first_step
-            self.y, self.yp, t = self.__run([3, 4], y0, yp0, t0, t0 + first_step)
+            y_guess = array(y0, float)
+            yp_guess = array(yp0, float)
+            state = self._problem_state()
+            if self.warm_initcond and self._last_state is not None \
+                    and self._last_state[0] == state:
+                last_y, last_yp = self._last_state[1:]
+                if self.compute_initcond == 1:
+                    # y0 of the differential variables is the given data
+                    y_guess[self.algvaridx] = last_y[self.algvaridx]
+                    yp_guess[:] = last_yp
+                else:
+                    y_guess[:] = last_y
+            self.y, self.yp, t = self.__run((3, 4), y_guess, yp_guess,
+                                            t0, t0 + first_step)
+            if self.success:
+                self._last_state = (state, self.y.copy(), self.yp.copy())
             t0_init = t
         else:
-            self.y = copy(y0)
-            self.yp = copy(yp0)
+            self.y = array(y0, float)
+            self.yp = array(yp0, float)
             t0_init = t0
         if not y_ic0_retn is None: y_ic0_retn[:] = self.y[:]
         if not yp_ic0_retn is None: yp_ic0_retn[:] = self.yp[:]
@@ -282,40 +375,63 @@ class ddaspk(DaeBase):
         self.initialized = True
         return t0_init
 
+    def _problem_state(self):
+        """The data that must be unchanged to warm start the initial
+        condition computation"""
+        algvaridx = self.algvaridx
+        if algvaridx is not None:
+            algvaridx = tuple(asarray(algvaridx).ravel())
+        return (self.neq, self.info[4], self.ml, self.mu, self.res,
+                self.res_cfunc, self.compute_initcond, algvaridx)
+
     def _reset(self, n, has_jac):
         # Calculate parameters for Fortran subroutine ddaspk.
         self.neq = n
-        self.algebraic_var = [1]*self.neq
-        if self.algvaridx is not None:
-            for ind in self.algvaridx:
-                self.algebraic_var[ind] = -1
-        self.info = zeros((20,), int32)  # default is all info=0
+        if self.algebraic_var is None or len(self.algebraic_var) != n:
+            self.algebraic_var = ones(self.neq, int32)
+            if self.algvaridx is not None:
+                self.algebraic_var[self.algvaridx] = -1
+        self.info.fill(0)  # default is all info=0
         self.info[17] = 2  # extra output on init cond computation
-        if (isscalar(self.atol) != isscalar(self.rtol)) or (
-               not isscalar(self.atol) and len(self.atol) != len(self.rtol)):
+        atol_scalar = isscalar(self.atol)
+        if (atol_scalar != isscalar(self.rtol)) or (
+               not atol_scalar and len(self.atol) != len(self.rtol)):
             raise ValueError('atol (%s) and rtol (%s) must be both scalar or'\
                     ' both arrays of length %s' % (self.atol, self.rtol, n))
-        if not isscalar(self.atol):
+        if not atol_scalar:
             self.info[1] = 1
         if has_jac:
             self.info[4] = 1
         if self.mu is not None or self.ml is not None:
             if self.mu is None: self.mu = 0
             if self.ml is None: self.ml = 0
-            self.info[5] = 1
+            # a band covering the whole matrix, as for small systems, is
+            # solved faster as a dense matrix. A compiled jac writes the
+            # banded storage directly, so must keep it.
+            if self.ml + self.mu + 1 < n or self.jac_cfunc is not None:
+                self.info[5] = 1
         if self.excl_algvar_err:
             self.info[15] = 1
         lrw = 50 + max(self.order+4,7)*n
-        if self.info[5]==0: lrw += pow(n, 2)
+        if self.info[5]==0: lrw += n*n
         elif self.info[4]==0: 
-            lrw += (2*self.ml+self.mu+1)*n + 2*(n/(self.ml+self.mu+1)+1)
+            lrw += (2*self.ml+self.mu+1)*n + 2*(n//(self.ml+self.mu+1)+1)
         else: lrw += (2*self.ml+self.mu+1)*n
         if self.info[15] == 1: lrw +=n
-        rwork = zeros((lrw,), float)
         liw = 40 + n
         if self.nonneg in [1, 3]: liw += n
         if self.compute_initcond or self.excl_algvar_err: liw += n
-        iwork = zeros((liw,), int32)
+        # reuse the work arrays of the previous reset if the size matches
+        if self.rwork is not None and len(self.rwork) == lrw:
+            rwork = self.rwork
+            rwork.fill(0.)
+        else:
+            rwork = zeros((lrw,), float)
+        if self.iwork is not None and len(self.iwork) == liw:
+            iwork = self.iwork
+            iwork.fill(0)
+        else:
+            iwork = zeros((liw,), int32)
         if self.tstop is not None:
             self.info[3] = 1
             rwork[0] = self.tstop
@@ -339,14 +455,11 @@ class ddaspk(DaeBase):
         lid = 40
         if self.info[9]==1 or self.info[9]==3 :
             lid = 40 + n
-            if isscalar(self.constraint_type): 
-                iwork[40:lid]=self.constraint_type
-            else: iwork[40:lid]=self.constraint_type[:]
+            # int32 already, so a plain fill or copy of the values
+            iwork[40:lid] = self.constraint_type
         self.info[10]=self.compute_initcond
-        if self.info[10] in [1, 2]:
-            iwork[lid:lid+n] = self.algebraic_var[:]
-        if self.excl_algvar_err:
-            iwork[lid:lid+n] = self.algebraic_var[:]
+        if self.info[10] in [1, 2] or self.excl_algvar_err:
+            iwork[lid:lid+n] = self.algebraic_var
         ## some overrides that one might want
         # self.info[17] = 1  # minimal printing inside init cond calc
         # self.info[17] = 2  # full printing inside init cond calc
@@ -359,12 +472,48 @@ class ddaspk(DaeBase):
 
         self.iwork = iwork
         
-        self.call_args = [self.info,self.rtol,self.atol,self.rwork,self.iwork]        #create storage
+        # y and yprime are updated in place by ddaspk, the other arguments are
+        # converted once here, so f2py can pass them on without a copy
+        self.call_args = (self.info, array(self.rtol, float, ndmin=1),
+                          array(self.atol, float, ndmin=1),
+                          self.rwork, self.iwork)
+        #create storage
         self.tmp_res = empty(self.neq, float)
         if (self.ml is None or self.mu is None) :
             self.tmp_jac = zeros((self.neq, self.neq), float)
         else:
             self.tmp_jac = zeros((self.ml + self.mu + 1, self.neq), float)
+        # ddaspk reads the jacobian in Fortran order, and in banded storage
+        # with ml extra rows on top for the LU factorization
+        if self.info[5] == 0:
+            self.tmp_wm = zeros(self.neq * self.neq, float)
+            self.wm_jac = self.tmp_wm.reshape((self.neq, self.neq), order='F')
+        else:
+            nrowpd = 2*self.ml + self.mu + 1
+            self.tmp_wm = zeros(nrowpd * self.neq, float)
+            self.wm_jac = self.tmp_wm.reshape((nrowpd, self.neq),
+                                              order='F')[self.ml:]
+        # jac returns the packed band, which ddaspk uses as dense matrix
+        self.band_as_dense = self.info[5] == 0 and self.ml is not None
+        if self.band_as_dense:
+            r, j = indices(self.tmp_jac.shape)
+            i = r + j - self.mu
+            inside = (i >= 0) & (i < self.neq)
+            self.packed_idx = (r[inside], j[inside])
+            self.dense_idx = (i[inside], j[inside])
+        self.bridge = None
+        if self.res_cfunc is not None:
+            resfn = _cfunc_capsule(self.res_cfunc)
+        elif self._cbridge is not None:
+            self.bridge = self._cbridge
+            resfn = self.bridge.residual_capsule()
+        else:
+            resfn = self._resFn
+        if self.jac_cfunc is not None:
+            jacfn = _cfunc_capsule(self.jac_cfunc)
+        else:
+            jacfn = self._jacFn
+        self.callbacks = (resfn, jacfn)
 
         self.success = 1
 
@@ -380,44 +529,68 @@ class ddaspk(DaeBase):
          the jacobian needed by ddaspk
         """
         self.jac(t, y, yp, cj, self.tmp_jac)
-        return self.tmp_jac
+        if self.band_as_dense:
+            self.wm_jac[self.dense_idx] = self.tmp_jac[self.packed_idx]
+        else:
+            self.wm_jac[:, :] = self.tmp_jac
+        return self.tmp_wm
 
     def solve(self, tspan, y0,  yp0, hook_fn = None):
         """ See dae.DaeBase
         """
         
-        t_retn  = empty([alen(tspan), ], float)
-        y_retn  = empty([alen(tspan), alen(y0)], float)
-        yp_retn = empty([alen(tspan), alen(y0)], float)
+        t_retn  = empty([len(tspan), ], float)
+        y_retn  = empty([len(tspan), len(y0)], float)
+        yp_retn = empty([len(tspan), len(y0)], float)
         
-        y_ic0_retn  = empty(alen(y0), float)
-        yp_ic0_retn  = empty(alen(y0), float)
+        y_ic0_retn  = empty(len(y0), float)
+        yp_ic0_retn  = empty(len(y0), float)
         tinit = self.init_step(tspan[0], y0, yp0, y_ic0_retn, yp_ic0_retn)
         
         t_retn[0] = tinit
         y_retn[0,:] = y0[:]
         yp_retn[0, :] = yp0[:]
         indbreak = None
-        for ind, time in enumerate(tspan[1:]):
+        # ddaspk continues the integration on each call, interpolating the
+        # solution at tout, so one call per output time is all that is needed
+        run = self.__run
+        for ind in range(1, len(tspan)):
             if not self.success:
-                indbreak = ind + 1
+                indbreak = ind
                 break
-            result = self.__run([2, 3], y_retn[ind], yp_retn[ind], t_retn[ind], time)
-            t_retn[ind+1] = result[2]
-            y_retn[ind+1][:] = result[0][:]
-            yp_retn[ind+1][:] = result[1][:]
-        self.t = t_retn[-1]
+            # ddaspk overwrites y and yprime, so start from a copy
+            y_retn[ind] = y_retn[ind-1]
+            yp_retn[ind] = yp_retn[ind-1]
+            y_retn[ind], yp_retn[ind], t_retn[ind] = run((2, 3),
+                    y_retn[ind], yp_retn[ind], t_retn[ind-1], tspan[ind])
         if indbreak is not None:
             self.t = t_retn[indbreak-1]
+            self.y = y_retn[indbreak-1].copy()
+            self.yp = yp_retn[indbreak-1].copy()
             return self.success, t_retn[:indbreak], y_retn[:indbreak],\
                    yp_retn[:indbreak], t_retn[indbreak], y_retn[indbreak],\
                    yp_retn[indbreak]
+        # keep the solver state in sync, so step can continue after solve
+        self.t = t_retn[-1]
+        self.y = y_retn[-1].copy()
+        self.yp = yp_retn[-1].copy()
         return self.success, t_retn, y_retn, yp_retn, None, None, None
 
-    def __run(self, states, *args):
-        # args are: y0,yprime0,t0,t1,res_params,jac_params
-        y1, y1prime, t, self.flag = self._runner(*( (self._resFn, self._jacFn) \
-                                           + args[:4] + tuple(self.call_args)))
+    def __run(self, states, y0, yp0, t0, t1):
+        resfn, jacfn = self.callbacks
+        if self.bridge is None:
+            y1, y1prime, t, self.flag = self._runner(resfn, jacfn, y0, yp0,
+                                                     t0, t1, *self.call_args)
+        else:
+            previous = self.bridge.set_residual(self.res)
+            try:
+                y1, y1prime, t, self.flag = self._runner(resfn, jacfn, y0, yp0,
+                                                     t0, t1, *self.call_args)
+                error = self.bridge.pop_error()
+            finally:
+                self.bridge.set_residual(previous)
+            if error is not None:
+                raise error
         if self.flag < 0:
             print('ddaspk:',self.messages.get(self.flag,
                                         'Unexpected istate=%s' % self.flag))
@@ -437,10 +610,10 @@ class ddaspk(DaeBase):
                     'first call of ''step'' method, or after changing options')
 
         if t > 0.0:
-            self.y, self.yp, self.t = self.__run([2, 3], self.y, self.yp, self.t, t)
+            self.y, self.yp, self.t = self.__run((2, 3), self.y, self.yp, self.t, t)
         else:
             self.info[2] = 1
-            self.y, self.yp, self.t = self.__run([1, 2], self.y, self.yp, self.t, -t)
+            self.y, self.yp, self.t = self.__run((1, 2), self.y, self.yp, self.t, -t)
             self.info[2] = 0
         y_retn[:] = self.y[:]
         if yp_retn is not None:
@@ -448,5 +621,24 @@ class ddaspk(DaeBase):
         
         return self.flag, self.t
 
-if ddaspk._runner:
-    DaeBase.integrator_classes.append(ddaspk)
+class ddaspk_c(ddaspk):
+    """
+    ddaspk solver calling the python residual through the C bridge in
+    _dae_cbridge, instead of through the f2py callback. This avoids the
+    conversion of the arguments and the copy of the residual on every call.
+    Use it as dae('ddaspk_c', res), with res as for ddaspk. The arrays passed
+    to res are only valid during the call, so res must not keep references to
+    them, and y and yprime are read only.
+    """
+    try:
+        from . import _dae_cbridge as _cbridge
+    except ImportError:
+        warnings.warn(str(sys.exc_info()[1]))
+        _runner = None
+    name = 'ddaspk_c'
+
+# Python >= 3.6 registers the classes through DaeBase.__init_subclass__
+if ddaspk._runner and sys.version_info < (3, 6):
+    DaeBase.register(ddaspk)
+if ddaspk_c._runner and sys.version_info < (3, 6):
+    DaeBase.register(ddaspk_c)
@@ -72,23 +72,23 @@ Source: http://www.netlib.org/ode/lsodi.f
 
 """
 
-from __future__ import print_function
+from __future__ import division, print_function
 
 __all__ = ['lsodi']
-__version__ = "$Id$"
 __docformat__ = "restructuredtext en"
 
-from numpy import asarray, array, zeros, sin, int32, isscalar, empty, alen
+from numpy import asarray, array, zeros, sin, int32, isscalar, empty
 from copy import copy
 from .dae import DaeBase
 import re, sys
+import warnings
 
 class lsodi(DaeBase):
     try:
         from .lsodi import lsodi as _runner
         from .lsodi import intdy as _intdy
     except ImportError:
-        print(sys.exc_info()[1])
+        warnings.warn(str(sys.exc_info()[1]))
         _runner = None
         _intdy = None
 
@@ -289,12 +289,12 @@ class lsodi(DaeBase):
         """ See dae.DaeBase
         """
         
-        t_retn = empty([alen(tspan), ], float)
-        y_retn = empty([alen(tspan), alen(y0)], float)
-        yp_retn = empty([alen(tspan), alen(y0)], float)
+        t_retn = empty([len(tspan), ], float)
+        y_retn = empty([len(tspan), len(y0)], float)
+        yp_retn = empty([len(tspan), len(y0)], float)
         
-        y_ic0_retn = empty(alen(y0), float)
-        yp_ic0_retn = empty(alen(y0), float)
+        y_ic0_retn = empty(len(y0), float)
+        yp_ic0_retn = empty(len(y0), float)
         tinit = self.init_step(tspan[0], y0, yp0, y_ic0_retn, yp_ic0_retn)
         
         t_retn[0] = tinit
@@ -376,5 +376,6 @@ class lsodi(DaeBase):
             yp_retn[:] = self.yp[:]
         return self.call_args[4], self.t
 
-if lsodi._runner:
-    DaeBase.integrator_classes.append(lsodi)
+# Python >= 3.6 registers the class through DaeBase.__init_subclass__
+if lsodi._runner and sys.version_info < (3, 6):
+    DaeBase.register(lsodi)
@@ -8,13 +8,20 @@ import numpy
 import scipy.sparse as sparse
 
 from numpy import (arange, zeros, array, dot, sqrt, cos, sin, allclose,
-                    empty, alen)
+                    empty, multiply, kron, eye)
 
 from numpy.testing import TestCase, run_module_suite
 from scipy.integrate import ode as Iode
-from scikits.odes import ode,dae
+from scikits.odes import ode,dae,batchdae
 from scikits.odes.sundials.common_defs import DTYPE
 
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Without numba, the residuals run as plain python"""
+        return lambda func: func
+
 class TestDae(TestCase):
     """
     Check integrate.dae
@@ -74,8 +81,8 @@ class TestDae(TestCase):
 
         for ig in igs:
             ig.set_options(old_api=old_api, **integrator_params)
-            z = empty((1+len(problem.stop_t),alen(problem.z0)), DTYPE)
-            zprime = empty((1+len(problem.stop_t),alen(problem.z0)), DTYPE)
+            z = empty((1+len(problem.stop_t),len(problem.z0)), DTYPE)
+            zprime = empty((1+len(problem.stop_t),len(problem.z0)), DTYPE)
             ist = ig.init_step(0., problem.z0, problem.zprime0, z[0], zprime[0])
             i=1
             for time in problem.stop_t:
@@ -101,6 +108,168 @@ class TestDae(TestCase):
             problem = problem_cls()
             self._do_problem(problem, 'ddaspk', **problem.ddaspk_pars)
 
+    def test_ddaspk_band_storage(self):
+        """Check ddaspk uses banded storage only if the band is smaller
+        than the matrix"""
+        for problem_cls, banded in [(SimpleOscillatorJac, 0),
+                                    (BatchOscillatorJac, 1)]:
+            problem = problem_cls()
+            ig = dae('ddaspk', problem.res, jacfn=problem.jac,
+                     **problem.ddaspk_pars)
+            ig.init_step(0., problem.z0, problem.zprime0)
+            assert ig._integrator.info[5] == banded, (problem.info(),)
+
+    def test_ddaspk_cfunc(self):
+        """Check the ddaspk solver with a compiled residual and jacobian"""
+        try:
+            from numba import cfunc, types
+        except ImportError:
+            self.skipTest('numba is not available')
+        dptr = types.CPointer(types.double)
+        iptr = types.CPointer(types.intc)
+        k = SimpleOscillator.k
+        m = SimpleOscillator.m
+
+        @cfunc(types.void(iptr, dptr, dptr, dptr, dptr, dptr, iptr, dptr, iptr))
+        def res_cfunc(neq, t, z, zp, cj, res, ires, rpar, ipar):
+            res[0] = m*zp[0] + k*z[1]
+            res[1] = zp[1] - z[0]
+
+        # pd is column major, with leading dimension neq when dense, and
+        # 2*lband+uband+1 when banded, row i-j+lband+uband for jac[i,j]
+        @cfunc(types.void(iptr, dptr, dptr, dptr, dptr, dptr, dptr, iptr))
+        def jac_dense(neq, t, z, zp, pd, cj, rpar, ipar):
+            pd[0] = m*cj[0] ;pd[2] = k
+            pd[1] = -1      ;pd[3] = cj[0]
+
+        @cfunc(types.void(iptr, dptr, dptr, dptr, dptr, dptr, dptr, iptr))
+        def jac_band(neq, t, z, zp, pd, cj, rpar, ipar):
+            pd[2] = m*cj[0] ;pd[5] = k
+            pd[3] = -1      ;pd[6] = cj[0]
+
+        # the python res and jac given next to the compiled ones must not
+        # be called
+        calls = []
+        def res(t, z, zp, res):
+            calls.append('res')
+            SimpleOscillator.res(problem, t, z, zp, res)
+
+        def jac(t, z, zp, cj, jac):
+            calls.append('jac')
+
+        for jac_cfunc, pars in [(None, {}), (jac_dense, {}),
+                                (jac_band, {'lband' : 1, 'uband' : 1})]:
+            problem = SimpleOscillator()
+            problem.res = res
+            if jac_cfunc is not None:
+                problem.jac = jac
+            self._do_problem(problem, 'ddaspk', rfn_cfunc=res_cfunc,
+                             jacfn_cfunc=jac_cfunc, **pars)
+            assert not calls, (jac_cfunc, pars, calls)
+
+    def test_ddaspk_c(self):
+        """Check the ddaspk solver with the C residual bridge"""
+        from scikits.odes.ddaspkint import ddaspk_c
+        if ddaspk_c._runner is None:
+            self.skipTest('the ddaspk C bridge is not available')
+        for problem_cls in PROBLEMS_DDASPK:
+            problem = problem_cls()
+            self._do_problem(problem, 'ddaspk_c', **problem.ddaspk_pars)
+
+    def test_ddaspk_warm_initcond(self):
+        """Check the warm started ddaspk initial condition computation starts
+        from the previous consistent values"""
+        calls = []
+        def res_y0(t, z, zp, res):
+            calls.append((z.copy(), zp.copy()))
+            problem.res(t, z, zp, res)
+
+        def res_yp0(t, z, zp, res):
+            """res_yp0 = 0 for z = (a, 2a), zp = (a, .), z[1] algebraic"""
+            calls.append((z.copy(), zp.copy()))
+            res[0] = zp[0] + z[0] - z[1]
+            res[1] = z[1] - 2.*z[0]
+
+        problem = SimpleOscillator()
+        zprime0 = problem.zprime0
+        for warm in [False, True]:
+            # 'y0' computes z from zp, the guess is z0 + perturbation
+            ig = dae('ddaspk', res_y0, compute_initcond='y0',
+                     warm_initcond=warm)
+            y_ic = empty(2, DTYPE)
+            ig.init_step(0., problem.z0 + 0.1, zprime0, y_ic)
+            assert ig._integrator.flag > 0, (warm, ig._integrator.flag)
+            assert allclose(y_ic, problem.z0), (problem.info(), y_ic)
+            del calls[:]
+            ig.init_step(0., problem.z0 + 0.01, zprime0, y_ic)
+            assert ig._integrator.flag > 0, (warm, ig._integrator.flag)
+            assert allclose(y_ic, problem.z0), (problem.info(), y_ic)
+            first_y = calls[0][0]
+            if warm:
+                assert allclose(first_y, problem.z0), (warm, first_y)
+            else:
+                assert allclose(first_y, problem.z0 + 0.01), (warm, first_y)
+
+            # 'yp0' keeps the differential z[0] and computes z[1] and zp[0]
+            del calls[:]
+            ig = dae('ddaspk', res_yp0, compute_initcond='yp0',
+                     algebraic_vars_idx=[1], warm_initcond=warm)
+            yp_ic = empty(2, DTYPE)
+            ig.init_step(0., [1., 1.9], [0.9, 0.], y_ic, yp_ic)
+            assert ig._integrator.flag > 0, (warm, ig._integrator.flag)
+            assert allclose(y_ic, [1., 2.]) and allclose(yp_ic[0], 1.), \
+                (warm, y_ic, yp_ic)
+            del calls[:]
+            ig.init_step(0., [1.1, 1.5], [0.5, 0.], y_ic, yp_ic)
+            assert ig._integrator.flag > 0, (warm, ig._integrator.flag)
+            assert allclose(y_ic, [1.1, 2.2]) and allclose(yp_ic[0], 1.1), \
+                (warm, y_ic, yp_ic)
+            first_y, first_yp = calls[0]
+            if warm:
+                assert allclose(first_y, [1.1, 2.]) and \
+                    allclose(first_yp[0], 1.), (warm, first_y, first_yp)
+            else:
+                assert allclose(first_y, [1.1, 1.5]) and \
+                    allclose(first_yp[0], 0.5), (warm, first_y, first_yp)
+
+    def test_constant_mass_jac(self):
+        """Check the packed A and K of the jacobian are built only once"""
+        problem = SimpleOscillatorJac()
+        jac = empty((3, 2), DTYPE)
+        problem.jac(0., problem.z0, problem.zprime0, 2., jac)
+        packed_A, packed_K = problem._packed_A, problem._packed_K
+        for cj in [2., 5.]:
+            problem.jac(0., problem.z0, problem.zprime0, cj, jac)
+            assert problem._packed_A is packed_A
+            assert problem._packed_K is packed_K
+            assert allclose(jac, [[0., problem.k], [problem.m*cj, cj],
+                                  [-1., 0.]]), (problem.info(), cj, jac)
+
+    def test_ddaspk_batch(self):
+        """Check the ddaspk solver on an ensemble of problems"""
+        problem = SimpleOscillator()
+        u0 = array([0.5, 1., 2.])
+        z0 = empty((len(u0), 2), DTYPE)
+        z0[:, 0] = problem.dotu0
+        z0[:, 1] = u0
+        zprime0 = empty((len(u0), 2), DTYPE)
+        zprime0[:, 0] = -problem.k*u0/problem.m
+        zprime0[:, 1] = problem.dotu0
+
+        def res(t, z, zp, res):
+            dot(zp, problem.A.T, out=res)
+            res += dot(z, problem.K.T)
+
+        ig = batchdae('ddaspk', res, lband=1, uband=1)
+        flag, t, z, zprime = ig.solve([0.] + problem.stop_t, z0, zprime0)[:4]
+        assert flag, (problem.info(), flag)
+        assert z.shape == (len(t), len(u0), 2)
+        omega = sqrt(problem.k / problem.m)
+        for (zt, time) in zip(z, t):
+            u = z0[:, 1]*cos(omega*time) + z0[:, 0]*sin(omega*time)/omega
+            assert allclose(u, zt[:, 1], atol=problem.atol,
+                            rtol=problem.rtol), (problem.info(), time)
+
     def test_lsodi(self):
         """Check the lsodi solver"""
         for problem_cls in PROBLEMS_LSODI:
@@ -146,7 +315,51 @@ class DAE:
     def info(self):
         return self.__class__.__name__ + ": No info given"
 
-class SimpleOscillator(DAE):
+class ConstantMassLinear(object):
+    r"""
+    Mixin for a linear residual A \dot{z} + K z with constant matrices A and
+    K. The jacobian is then cj*A + K, so A and K are packed in band format
+    once, and every jacobian call only scales and adds them
+    """
+    def _set_matrices(self, A, K):
+        self.A = A
+        self.K = K
+        # storage for K z, and A and K packed for the band _packed_band
+        self.tmp = empty(len(A), DTYPE)
+        self._packed_band = None
+        self._packed_A = None
+        self._packed_K = None
+
+    def res(self, t, z, zp, res):
+        dot(self.A, zp, out=res)
+        res += dot(self.K, z, out=self.tmp)
+
+    def _pack(self, M, lband, uband):
+        n = len(M)
+        packed = zeros((lband + uband + 1, n), DTYPE)
+        for j in range(n):
+            for i in range(max(0, j - uband), min(n, j + lband + 1)):
+                packed[i-j+uband, j] = M[i, j]
+        return packed
+
+    def packed_jac(self, cj, jac, lband, uband):
+        """Set jac to cj*A + K in packed band format jac[i-j+uband, j]"""
+        if self._packed_band != (lband, uband):
+            self._packed_A = self._pack(self.A, lband, uband)
+            self._packed_K = self._pack(self.K, lband, uband)
+            self._packed_band = (lband, uband)
+        multiply(self._packed_A, cj, out=jac)
+        jac += self._packed_K
+
+class PackedJac(object):
+    """Mixin for a ConstantMassLinear problem with the band in ddaspk_pars"""
+    def jac(self, t, y, yp, cj, jac):
+        """Jacobian[i,j] is dRES(i)/dY(j) + CJ*dRES(i)/dYPRIME(j), in packed
+        band format jac[i-j+uband, j]"""
+        self.packed_jac(cj, jac, self.ddaspk_pars['lband'],
+                        self.ddaspk_pars['uband'])
+
+class SimpleOscillator(ConstantMassLinear, DAE):
     r"""
     Free vibration of a simple oscillator::
         m \ddot{u} + k u = 0, u(0) = u_0, \dot{u}(0)=\dot{u}_0
@@ -164,20 +377,13 @@ class SimpleOscillator(DAE):
 
     def __init__(self):
         self.lsodi_pars = {'adda_func' : self.adda}
+        self._set_matrices(array([[self.m, 0.], [0., 1.]], DTYPE),
+                           array([[0., self.k], [-1., 0.]], DTYPE))
 
     def info(self):
         doc = self.__class__.__name__ + ": 2x2 constant mass matrix"
         return doc
 
-    def res(self, t, z, zp, res):
-        tmp1 = zeros((2,2), DTYPE)
-        tmp2 = zeros((2,2), DTYPE)
-        tmp1[0,0] = self.m
-        tmp1[1,1] = 1.
-        tmp2[0,1] = self.k
-        tmp2[1,0] = -1.
-        res[:] = dot(tmp1, zp)[:]+dot(tmp2, z)[:]
-
     def adda(self, t, y, ml, mu, p, nrowp):
         p[0,0] -= self.m
         p[1,1] -= 1.0
@@ -193,22 +399,60 @@ class SimpleOscillator(DAE):
             ##print('verify SO', time, ok, z, u, self.z0)
         return ok
 
-class SimpleOscillatorJac(SimpleOscillator):
-    def jac(self, t, y, yp, cj, jac):
-        """Jacobian[i,j] is dRES(i)/dY(j) + CJ*dRES(i)/dYPRIME(j)"""
-        jc = zeros((len(y), len(y)), DTYPE)
-        cj_in = cj
-        jac[0][0] = self.m*cj_in ;jac[0][1] = self.k
-        jac[1][0] = -1       ;jac[1][1] = cj_in;
+class SimpleOscillatorJac(PackedJac, SimpleOscillator):
+    ddaspk_pars = {'lband' : 1, 'uband' : 1}
+
+class BatchOscillator(SimpleOscillator):
+    r"""
+    SimpleOscillator for several initial conditions u_0 at once, as one
+    system with a block diagonal jacobian. With lband = uband = 1 the band
+    is smaller than the matrix, so ddaspk uses its banded linear solver
+    """
+    ddaspk_pars = {'lband' : 1, 'uband' : 1}
+    u0s = array([0.5, 1., 2.], DTYPE)
+
+    def __init__(self):
+        SimpleOscillator.__init__(self)
+        nosc = len(self.u0s)
+        self._set_matrices(kron(eye(nosc), self.A), kron(eye(nosc), self.K))
+        self.z0 = empty(2*nosc, DTYPE)
+        self.z0[0::2] = self.dotu0
+        self.z0[1::2] = self.u0s
+        self.zprime0 = empty(2*nosc, DTYPE)
+        self.zprime0[0::2] = -self.k*self.u0s/self.m
+        self.zprime0[1::2] = self.dotu0
+
+    def info(self):
+        doc = self.__class__.__name__ + ": %d oscillators, banded jacobian" \
+                % len(self.u0s)
+        return doc
+
+    def verify(self, zs, zps, t):
+        omega = sqrt(self.k / self.m)
+        ok = True
+        for (z, zp, time) in zip(zs, zps, t):
+            u = self.u0s*cos(omega*time)+self.dotu0*sin(omega*time)/omega
+            ok = ok and allclose(u, z[1::2], atol=self.atol, rtol=self.rtol) \
+                and allclose(z[0::2], zp[1::2], atol=self.atol, rtol=self.rtol)
+        return ok
+
+class BatchOscillatorJac(PackedJac, BatchOscillator):
+    pass
 
 class SimpleOscillatorJacIDA(SimpleOscillator):
     def jac(self, t, y, yp, residual, cj, jac):
         """Jacobian[i,j] is dRES(i)/dY(j) + CJ*dRES(i)/dYPRIME(j)"""
-        jc = zeros((len(y), len(y)), DTYPE)
         cj_in = cj
         jac[0][0] = self.m*cj_in ;jac[0][1] = self.k
         jac[1][0] = -1       ;jac[1][1] = cj_in;
 
+@njit(cache=True)
+def stiff_res(t, y, yp, res):
+    """Residual of StiffVODECompare, compiled if numba is available"""
+    res[0] = yp[0] + 0.04*y[0] - 1e4*y[1]*y[2]
+    res[2] = yp[2] - 3e7*y[1]*y[1]
+    res[1] = yp[1] +yp[0]+yp[2]
+
 class StiffVODECompare(DAE):
     r"""
     We create a stiff problem, obtain the vode solution, and compare with
@@ -279,6 +523,8 @@ class StiffVODECompare(DAE):
         #         compute_initcond,constraint_init,constraint_type,algebraic_var
         self.ddaspk_pars = {'rtol' : [1e-4,1e-4,1e-4],
                             'atol' : [1e-8,1e-14,1e-6],
+                            'lband' : 1,
+                            'uband' : 2,
                            }
         self.ida_pars = {'rtol' : 1e-4,
                          'atol' : [1e-8,1e-14,1e-6],
@@ -289,9 +535,7 @@ class StiffVODECompare(DAE):
                            }
 
     def res(self, t, y, yp, res):
-        res[0] = yp[0] + 0.04*y[0] - 1e4*y[1]*y[2]
-        res[2] = yp[2] - 3e7*y[1]*y[1]
-        res[1] = yp[1] +yp[0]+yp[2]
+        stiff_res(t, y, yp, res)
 
     def adda(self, t, y, ml, mu, p, nrowp):
         p[0,0] -= 1.0
@@ -306,7 +550,7 @@ class StiffVODECompare(DAE):
                  allclose(self.sol2, y, atol=self.atol, rtol=self.rtol) )
 
 PROBLEMS_DDASPK = [SimpleOscillator, StiffVODECompare,
-            SimpleOscillatorJac ]
+            SimpleOscillatorJac, BatchOscillator, BatchOscillatorJac ]
 PROBLEMS_IDA = [SimpleOscillator, StiffVODECompare,
             SimpleOscillatorJacIDA ]
 PROBLEMS_LSODI = [SimpleOscillator, StiffVODECompare]
@@ -275,10 +275,27 @@ class build_ext(_build_ext):
             ),
         ]
 
+    def _get_cbridge_ext(self):
+        """
+        The C residual bridge of the ddaspk_c integrator. It does not use
+        sundials, only the numpy C API. The numpy include dir is added by the
+        numpy.distutils build_ext this command derives from, a plain
+        cythonize of this extension fails with numpy/arrayobject.h not found.
+        """
+        from setuptools import Extension
+
+        return [
+            Extension(
+                "scikits.odes._dae_cbridge",
+                sources = [join('scikits', 'odes', '_dae_cbridge.pyx')],
+            ),
+        ]
+
 
     def run(self):
         """ Distutils calls this method to run the command """
         from Cython.Build import cythonize
         self.extensions.extend(cythonize(self._get_cython_ext()))
+        self.extensions.extend(cythonize(self._get_cbridge_ext()))
         _build_ext.run(self) # actually do the build
 